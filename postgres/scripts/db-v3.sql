@@ -25,6 +25,8 @@ CREATE TABLE IF NOT EXISTS cars
     availability        BOOLEAN     NOT NULL
 );
 
+CREATE INDEX IF NOT EXISTS ix_cars_available ON cars (availability) WHERE availability = true;
+
 -- Grant permissions to program user
 GRANT ALL PRIVILEGES ON TABLE cars TO program;
 GRANT USAGE, SELECT ON SEQUENCE cars_id_seq TO program;
@@ -51,6 +53,8 @@ CREATE TABLE IF NOT EXISTS rental
         CHECK (status IN ('IN_PROGRESS', 'FINISHED', 'CANCELED'))
 );
 
+CREATE INDEX IF NOT EXISTS ix_rental_username ON rental (username);
+
 -- Grant permissions to program user
 GRANT ALL PRIVILEGES ON TABLE rental TO program;
 GRANT USAGE, SELECT ON SEQUENCE rental_id_seq TO program;
@@ -1,16 +1,56 @@
 from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import Optional
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import TypeAdapter
 import uvicorn
+import os
 import uuid
+import time
 
-from database import engine, get_db, Base
+from database import get_db
 from models import Car
-from schemas import CarResponse, PaginationResponse
-
-Base.metadata.create_all(bind=engine)
+from schemas import CarResponse, PaginationResponse, CarsBatchRequest
+
+app = FastAPI(title="Cars Service", default_response_class=ORJSONResponse)
+
+# Columns returned by the list endpoint, selected as plain rows
+# instead of full ORM instances
+CAR_COLUMNS = (
+    Car.car_uid,
+    Car.brand,
+    Car.model,
+    Car.registration_number,
+    Car.power,
+    Car.price,
+    Car.type,
+    Car.availability
+)
+
+# Validates a whole page of rows in one pydantic-core call
+_cars_adapter = TypeAdapter(list[CarResponse])
+
+# Cached total counts for the cars list, so pagination doesn't run COUNT(*)
+# on every page. Key: show_all, Value: (timestamp, count)
+# The cache is per process: an availability change clears it only in the
+# worker that handled the PATCH, other workers can report the old total for
+# up to COUNT_CACHE_TTL seconds
+COUNT_CACHE_TTL = 30.0
+_count_cache: dict[bool, tuple[float, int]] = {}
+
+
+async def get_cached_count(db: AsyncSession, show_all: bool, ttl: float = COUNT_CACHE_TTL) -> int:
+    cached = _count_cache.get(show_all)
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+
+    stmt = select(func.count(Car.id))
+    if not show_all:
+        stmt = stmt.where(Car.availability == True)
 
-app = FastAPI(title="Cars Service")
+    total_elements = await db.scalar(stmt)
+    _count_cache[show_all] = (time.monotonic(), total_elements)
+    return total_elements
 
 
 @app.get("/manage/health")
@@ -19,76 +59,83 @@ def health_check():
 
 
 @app.get("/api/v1/cars", response_model=PaginationResponse)
-def get_cars(
+async def get_cars(
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
     show_all: bool = Query(False),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Car)
+    stmt = select(*CAR_COLUMNS)
 
     if not show_all:
-        query = query.filter(Car.availability == True)
+        stmt = stmt.where(Car.availability == True)
 
-    total_elements = query.count()
+    total_elements = await get_cached_count(db, show_all)
 
     offset = (page - 1) * size
-    cars = query.offset(offset).limit(size).all()
-
-    items = [
-        CarResponse(
-            car_uid=car.car_uid,
-            brand=car.brand,
-            model=car.model,
-            registration_number=car.registration_number,
-            power=car.power,
-            price=car.price,
-            type=car.type,
-            available=car.availability
-        )
-        for car in cars
-    ]
-
-    return PaginationResponse(
+    result = await db.execute(stmt.offset(offset).limit(size))
+    cars = result.all()
+
+    items = _cars_adapter.validate_python(cars, from_attributes=True)
+
+    # Returned as a ready response so FastAPI doesn't validate it
+    # against response_model a second time
+    page_response = PaginationResponse(
         page=page,
         page_size=len(items),
         total_elements=total_elements,
         items=items
     )
+    return ORJSONResponse(page_response.model_dump(mode="json", by_alias=True))
+
+
+@app.post("/api/v1/cars/batch", response_model=list[CarResponse])
+async def get_cars_batch(batch: CarsBatchRequest, db: AsyncSession = Depends(get_db)):
+    # Unknown uids are left out of the result
+    result = await db.execute(select(*CAR_COLUMNS).where(Car.car_uid.in_(batch.car_uids)))
+    items = _cars_adapter.validate_python(result.all(), from_attributes=True)
+    return ORJSONResponse(_cars_adapter.dump_python(items, mode="json", by_alias=True))
 
 
 @app.get("/api/v1/cars/{car_uid}", response_model=CarResponse)
-def get_car(car_uid: uuid.UUID, db: Session = Depends(get_db)):
-    car = db.query(Car).filter(Car.car_uid == car_uid).first()
+async def get_car(car_uid: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    car = await db.scalar(select(Car).where(Car.car_uid == car_uid))
     if not car:
         raise HTTPException(status_code=404, detail="Car not found")
 
-    return CarResponse(
-        car_uid=car.car_uid,
-        brand=car.brand,
-        model=car.model,
-        registration_number=car.registration_number,
-        power=car.power,
-        price=car.price,
-        type=car.type,
-        available=car.availability
-    )
+    return ORJSONResponse(CarResponse.model_validate(car).model_dump(mode="json", by_alias=True))
 
 
 @app.patch("/api/v1/cars/{car_uid}/availability")
-def update_car_availability(
+async def update_car_availability(
     car_uid: uuid.UUID,
     available: bool,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    car = db.query(Car).filter(Car.car_uid == car_uid).first()
-    if not car:
-        raise HTTPException(status_code=404, detail="Car not found")
-
-    car.availability = available
-    db.commit()
+    # Reserving is a compare-and-set, so a car already taken by another
+    # rental is never reported as reserved; releasing always succeeds
+    stmt = update(Car).where(Car.car_uid == car_uid)
+    if not available:
+        stmt = stmt.where(Car.availability == True)
+    result = await db.execute(stmt.values(availability=available).returning(Car.id))
+    if result.first() is None:
+        exists = await db.scalar(select(Car.id).where(Car.car_uid == car_uid))
+        if exists is None:
+            raise HTTPException(status_code=404, detail="Car not found")
+        raise HTTPException(status_code=409, detail="Car is not available")
+
+    await db.commit()
+    _count_cache.clear()
     return {"status": "ok"}
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8070)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8070,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count()))
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, CheckConstraint
+from sqlalchemy import Column, Integer, String, Boolean, CheckConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from database import Base
@@ -8,7 +8,7 @@ class Car(Base):
     __tablename__ = "cars"
 
     id = Column(Integer, primary_key=True, index=True)
-    car_uid = Column(UUID(as_uuid=True), default=uuid.uuid4, unique=True, nullable=False)
+    car_uid = Column(UUID(as_uuid=True), default=uuid.uuid4, unique=True, index=True, nullable=False)
     brand = Column(String(80), nullable=False)
     model = Column(String(80), nullable=False)
     registration_number = Column(String(20), nullable=False)
@@ -22,4 +22,5 @@ class Car(Base):
             "type IN ('SEDAN', 'SUV', 'MINIVAN', 'ROADSTER')",
             name="car_type_check"
         ),
+        Index("ix_cars_available", "availability", postgresql_where=text("availability = true")),
     )
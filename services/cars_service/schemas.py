@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from uuid import UUID
 from typing import Literal, Optional
 
@@ -25,11 +25,9 @@ class CarResponse(BaseModel):
     power: Optional[int] = None
     price: int
     type: str
-    available: bool
+    available: bool = Field(validation_alias="availability")
 
-    class Config:
-        from_attributes = True
-        populate_by_name = True
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 
 class PaginationResponse(BaseModel):
@@ -38,5 +36,10 @@ class PaginationResponse(BaseModel):
     total_elements: int = Field(serialization_alias="totalElements")
     items: list[CarResponse]
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class CarsBatchRequest(BaseModel):
+    car_uids: list[UUID] = Field(validation_alias="carUids")
+
+    model_config = ConfigDict(populate_by_name=True)
@@ -0,0 +1,75 @@
+import os
+import logging
+from typing import Optional
+
+import orjson
+import redis.asyncio as redis
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+# Last known upstream data for fallbacks, shared between workers through Redis.
+# Entries are also kept in a small per-process TTL cache, which is the only
+# storage when REDIS_URL is not set. Redis errors are logged and treated as
+# cache misses, so the cache never fails a request.
+class FallbackCache:
+    def __init__(
+        self,
+        prefix: str,
+        ttl: int = 3600,
+        local_ttl: float = 300.0,
+        local_maxsize: int = 10_000,
+        redis_url: Optional[str] = REDIS_URL
+    ):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local: TTLCache = TTLCache(maxsize=local_maxsize, ttl=local_ttl)
+        self.redis: Optional[redis.Redis] = None
+        if redis_url:
+            self.redis = redis.from_url(
+                redis_url,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5
+            )
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self.local.get(key)
+        if value is not None or self.redis is None:
+            return value
+
+        try:
+            cached = await self.redis.get(f"{self.prefix}:{key}")
+        except redis.RedisError as e:
+            logger.warning(f"Failed to read {self.prefix}:{key} from Redis: {str(e)}")
+            return None
+
+        if cached is None:
+            return None
+        value = orjson.loads(cached)
+        self.local[key] = value
+        return value
+
+    async def set(self, key: str, value: dict):
+        # Reads store the same values over and over; Redis is only written
+        # when this process hasn't already stored the value in the last
+        # local_ttl seconds
+        if self.local.get(key) == value:
+            return
+        self.local[key] = value
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.setex(f"{self.prefix}:{key}", self.ttl, orjson.dumps(value))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to write {self.prefix}:{key} to Redis: {str(e)}")
+
+    def snapshot(self) -> dict:
+        return dict(self.local)
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
@@ -1,19 +1,27 @@
 import time
 import asyncio
-from typing import Callable, Any, Optional
+from enum import IntEnum
+from typing import Callable, Awaitable, Any, Optional
 from dataclasses import dataclass
-import inspect
 
 
-@dataclass
+class CircuitState(IntEnum):
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+
+@dataclass(slots=True)
 class CircuitBreakerStats:
     failures: int = 0
     success: int = 0
-    last_failure_time: Optional[float] = None
-    state: str = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
+    last_failure_time: Optional[float] = None  # time.monotonic() value
+    state: CircuitState = CircuitState.CLOSED
 
 
 class CircuitBreaker:
+    __slots__ = ("failure_threshold", "timeout", "name", "stats", "_lock")
+
     def __init__(
         self,
         failure_threshold: int = 5,
@@ -24,55 +32,63 @@ class CircuitBreaker:
         self.timeout = timeout
         self.name = name
         self.stats = CircuitBreakerStats()
+        # Guards state transitions between concurrent calls
+        self._lock = asyncio.Lock()
 
-    async def call(self, func: Callable, *args, fallback: Optional[Callable] = None, **kwargs) -> Any:
-        if self.stats.state == "OPEN":
-            if self._should_attempt_reset():
-                self.stats.state = "HALF_OPEN"
-            else:
-                if fallback:
-                    if asyncio.iscoroutinefunction(fallback):
-                        return await fallback()
-                    return fallback()
-                raise Exception(f"Circuit breaker {self.name} is OPEN")
+    # func and fallback must be coroutine functions
+    async def call(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        fallback: Optional[Callable[[], Awaitable[Any]]] = None,
+        **kwargs
+    ) -> Any:
+        async with self._lock:
+            is_open = self.stats.state == CircuitState.OPEN
+            if is_open and self._should_attempt_reset():
+                self.stats.state = CircuitState.HALF_OPEN
+                is_open = False
+
+        if is_open:
+            if fallback:
+                return await fallback()
+            raise Exception(f"Circuit breaker {self.name} is OPEN")
 
         try:
-            if asyncio.iscoroutinefunction(func):
-                result = await func(*args, **kwargs)
-            else:
-                result = func(*args, **kwargs)
-            self._on_success()
-            return result
+            result = await func(*args, **kwargs)
         except Exception as e:
-            self._on_failure()
+            async with self._lock:
+                self._on_failure()
             if fallback:
-                if asyncio.iscoroutinefunction(fallback):
-                    return await fallback()
-                return fallback()
+                return await fallback()
             raise e
 
+        async with self._lock:
+            self._on_success()
+        return result
+
     def _on_success(self):
         self.stats.failures = 0
-        if self.stats.state == "HALF_OPEN":
-            self.stats.state = "CLOSED"
+        if self.stats.state == CircuitState.HALF_OPEN:
+            self.stats.state = CircuitState.CLOSED
 
     def _on_failure(self):
         self.stats.failures += 1
-        self.stats.last_failure_time = time.time()
+        self.stats.last_failure_time = time.monotonic()
 
         if self.stats.failures >= self.failure_threshold:
-            self.stats.state = "OPEN"
+            self.stats.state = CircuitState.OPEN
 
     def _should_attempt_reset(self) -> bool:
         if self.stats.last_failure_time is None:
             return False
 
-        return (time.time() - self.stats.last_failure_time) >= self.timeout
+        return (time.monotonic() - self.stats.last_failure_time) >= self.timeout
 
     def get_state(self) -> dict:
         return {
             "name": self.name,
-            "state": self.stats.state,
+            "state": self.stats.state.name,
             "failures": self.stats.failures,
             "last_failure_time": self.stats.last_failure_time
         }
@@ -1,38 +1,78 @@
-from fastapi import FastAPI, Header, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from typing import Optional, List
+import asyncio
 import httpx
+import orjson
 import uvicorn
-from datetime import datetime
 import os
 import logging
+from cachetools import TTLCache
 
 from schemas import (
     PaginationResponse, RentalResponse, CreateRentalRequest,
-    CreateRentalResponse, CarInfo, PaymentInfo, ErrorResponse
+    CreateRentalResponse, PaymentInfo
 )
 from circuit_breaker import CircuitBreakerManager
 from retry_queue import retry_queue
+from cache import FallbackCache
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Gateway Service")
+app = FastAPI(title="Gateway Service", default_response_class=ORJSONResponse)
 
 CARS_SERVICE_URL = os.getenv("CARS_SERVICE_URL", "http://cars:8070")
 RENTAL_SERVICE_URL = os.getenv("RENTAL_SERVICE_URL", "http://rental:8060")
 PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL", "http://payment:8050")
 
+# Upstream connection pool, per worker process
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5.0"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "100"))
+
 circuit_breaker_manager = CircuitBreakerManager()
+CARS_BREAKER = circuit_breaker_manager.get_breaker("cars_service")
+RENTAL_BREAKER = circuit_breaker_manager.get_breaker("rental_service")
+PAYMENT_BREAKER = circuit_breaker_manager.get_breaker("payment_service")
+
+# Shared keep-alive connection pool for all upstream calls,
+# created on startup and closed on shutdown
+http_client: Optional[httpx.AsyncClient] = None
 
 
-# In-memory cache for car information
+# Cache for car information used by fallbacks, shared through Redis
 # Key: carUid, Value: dict with car details
-car_info_cache = {}
+car_info_cache = FallbackCache("car", ttl=3600)
+# Last known payments, used by the payment fallbacks
+# Key: paymentUid, Value: dict with payment details
+payment_info_cache = FallbackCache("payment", ttl=3600)
+
+# Short-lived read caches in front of the cars service, dropped on every
+# availability change made through the gateway
+CARS_PAGE_TTL = 10
+cars_page_cache: TTLCache = TTLCache(maxsize=1024, ttl=CARS_PAGE_TTL)
+car_details_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# In-flight upstream GETs keyed by URL, so concurrent identical lookups
+# share a single request
+_inflight: dict[str, asyncio.Task] = {}
 
 
 @app.on_event("startup")
 async def startup_event():
+    global http_client
+    # HTTP/2 is negotiated where the upstream supports it (TLS/ALPN);
+    # plain http:// upstreams keep using HTTP/1.1 keep-alive
+    http_client = httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=30.0
+        )
+    )
     await retry_queue.start()
     logger.info("Retry queue started")
 
@@ -41,6 +81,13 @@ async def startup_event():
 async def shutdown_event():
     await retry_queue.stop()
     logger.info("Retry queue stopped")
+    await http_client.aclose()
+    await car_info_cache.close()
+    await payment_info_cache.close()
+
+
+def get_user(x_user_name: str = Header(..., alias="X-User-Name")) -> str:
+    return x_user_name
 
 
 @app.get("/manage/health")
@@ -50,26 +97,41 @@ def health_check():
 
 @app.get("/manage/cache")
 def cache_status():
-    return {"car_cache": car_info_cache}
+    return {
+        "car_cache": car_info_cache.snapshot(),
+        "payment_cache": payment_info_cache.snapshot()
+    }
 
 
 @app.get("/api/v1/cars", response_model=PaginationResponse)
 async def get_cars(
+    response: Response,
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
     show_all: bool = Query(False, alias="showAll")
 ):
-    async def fetch_cars():
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(
-                f"{CARS_SERVICE_URL}/api/v1/cars",
-                params={"page": page, "size": size, "show_all": show_all}
-            )
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Cars service error")
-            return response.json()
+    key = (page, size, show_all)
+
+    # Cache hits are served without going through the breaker, so they
+    # neither count as upstream successes nor give way to the fallback
+    cars_page = cars_page_cache.get(key)
+    if cars_page is not None:
+        response.headers["Cache-Control"] = f"max-age={CARS_PAGE_TTL}, stale-while-revalidate=30"
+        return cars_page
 
-    def fallback():
+    async def fetch_cars():
+        cars_response = await http_client.get(
+            f"{CARS_SERVICE_URL}/api/v1/cars",
+            params={"page": page, "size": size, "show_all": show_all}
+        )
+        if cars_response.status_code != 200:
+            raise HTTPException(status_code=cars_response.status_code, detail="Cars service error")
+        cars_page = orjson.loads(cars_response.content)
+        cars_page_cache[key] = cars_page
+        response.headers["Cache-Control"] = f"max-age={CARS_PAGE_TTL}, stale-while-revalidate=30"
+        return cars_page
+
+    async def fallback():
         # Return default car when service is unavailable
         return {
             "page": page,
@@ -89,94 +151,108 @@ async def get_cars(
             ]
         }
 
-    breaker = circuit_breaker_manager.get_breaker("cars_service")
-    return await breaker.call(fetch_cars, fallback=fallback)
+    return await CARS_BREAKER.call(fetch_cars, fallback=fallback)
 
 
 @app.post("/api/v1/rental", response_model=CreateRentalResponse)
 async def create_rental(
     rental_request: CreateRentalRequest,
-    x_user_name: str = Header(..., alias="X-User-Name")
+    username: str = Depends(get_user)
 ):
+    days = (rental_request.date_to - rental_request.date_from).days
+    if days <= 0:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+
+    car_uid = str(rental_request.car_uid)
+    date_from = rental_request.date_from.isoformat()
+    date_to = rental_request.date_to.isoformat()
+
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            # Get car details
-            car_response = await client.get(
-                f"{CARS_SERVICE_URL}/api/v1/cars/{rental_request.car_uid}"
-            )
+        # The car is only needed for the price, so look it up while reserving it
+        car_response, reserve_response = await asyncio.gather(
+            http_client.get(f"{CARS_SERVICE_URL}/api/v1/cars/{car_uid}"),
+            set_car_availability(car_uid, False),
+            return_exceptions=True
+        )
+        # The cars service only answers 200 when this request took the car,
+        # so the rollback never frees a car rented by someone else
+        reserved = (
+            isinstance(reserve_response, httpx.Response)
+            and reserve_response.status_code == 200
+        )
+
+        try:
+            for response in (car_response, reserve_response):
+                if isinstance(response, BaseException):
+                    raise response
             if car_response.status_code != 200:
                 raise HTTPException(status_code=404, detail="Car not found")
+            if reserve_response.status_code == 409:
+                raise HTTPException(status_code=409, detail="Car is not available")
+            if reserve_response.status_code != 200:
+                raise HTTPException(status_code=500, detail="Failed to reserve car")
 
-            car_data = car_response.json()
+            car_data = orjson.loads(car_response.content)
 
             # Cache car information for future fallback
-            car_info_cache[str(rental_request.car_uid)] = {
-                "carUid": car_data.get("carUid"),
-                "brand": car_data.get("brand", ""),
-                "model": car_data.get("model", ""),
-                "registrationNumber": car_data.get("registrationNumber", "")
-            }
+            await cache_car_info(car_uid, car_data)
 
             # Calculate rental price
-            date_from = datetime.fromisoformat(rental_request.date_from)
-            date_to = datetime.fromisoformat(rental_request.date_to)
-            days = abs((date_to - date_from).days)
             total_price = days * car_data["price"]
 
             # Create payment
-            payment_response = await client.post(
+            payment_response = await http_client.post(
                 f"{PAYMENT_SERVICE_URL}/api/v1/payment",
                 json={"price": total_price}
             )
             if payment_response.status_code != 200:
                 raise HTTPException(status_code=500, detail="Payment service error")
-
-            payment_data = payment_response.json()
-
-            # Reserve car
-            reserve_response = await client.patch(
-                f"{CARS_SERVICE_URL}/api/v1/cars/{rental_request.car_uid}/availability",
-                params={"available": False}
-            )
-            if reserve_response.status_code != 200:
-                # Rollback payment
-                await client.delete(f"{PAYMENT_SERVICE_URL}/api/v1/payment/{payment_data['paymentUid']}")
-                raise HTTPException(status_code=500, detail="Failed to reserve car")
-
-            # Create rental
-            rental_response = await client.post(
-                f"{RENTAL_SERVICE_URL}/api/v1/rental",
-                json={
-                    "username": x_user_name,
-                    "paymentUid": payment_data["paymentUid"],
-                    "carUid": str(rental_request.car_uid),
-                    "dateFrom": rental_request.date_from,
-                    "dateTo": rental_request.date_to
-                }
+        except Exception:
+            # Rollback car reservation
+            if reserved:
+                await release_car(car_uid)
+            raise
+
+        payment_data = orjson.loads(payment_response.content)
+
+        # Create rental
+        rental_response = await http_client.post(
+            f"{RENTAL_SERVICE_URL}/api/v1/rental",
+            json={
+                "username": username,
+                "paymentUid": payment_data["paymentUid"],
+                "carUid": car_uid,
+                "dateFrom": date_from,
+                "dateTo": date_to
+            }
+        )
+        if rental_response.status_code != 200:
+            # Rollback car availability and payment
+            await asyncio.gather(
+                release_car(car_uid),
+                http_client.delete(f"{PAYMENT_SERVICE_URL}/api/v1/payment/{payment_data['paymentUid']}"),
+                return_exceptions=True
             )
-            if rental_response.status_code != 200:
-                # Rollback car availability and payment
-                await client.patch(
-                    f"{CARS_SERVICE_URL}/api/v1/cars/{rental_request.car_uid}/availability",
-                    params={"available": True}
-                )
-                await client.delete(f"{PAYMENT_SERVICE_URL}/api/v1/payment/{payment_data['paymentUid']}")
-                raise HTTPException(status_code=500, detail="Rental service error")
-
-            rental_data = rental_response.json()
-
-            return CreateRentalResponse(
-                rental_uid=rental_data["rentalUid"],
-                status=rental_data["status"],
-                car_uid=rental_request.car_uid,
-                date_from=rental_request.date_from,
-                date_to=rental_request.date_to,
-                payment=PaymentInfo(
-                    payment_uid=payment_data["paymentUid"],
-                    status=payment_data["status"],
-                    price=payment_data["price"]
-                )
+            raise HTTPException(status_code=500, detail="Rental service error")
+
+        rental_data = orjson.loads(rental_response.content)
+        await cache_payment_info(payment_data["paymentUid"], payment_data)
+
+        created = CreateRentalResponse(
+            rental_uid=rental_data["rentalUid"],
+            status=rental_data["status"],
+            car_uid=rental_request.car_uid,
+            date_from=date_from,
+            date_to=date_to,
+            payment=PaymentInfo(
+                payment_uid=payment_data["paymentUid"],
+                status=payment_data["status"],
+                price=payment_data["price"]
             )
+        )
+        # Dumped in python mode so the UUIDs reach orjson as UUID objects,
+        # and FastAPI doesn't validate the model a second time
+        return ORJSONResponse(created.model_dump(by_alias=True))
     except httpx.RequestError as e:
         logger.error(f"Service unavailable: {str(e)}")
         # For rental creation, always return "Payment Service unavailable"
@@ -189,356 +265,411 @@ async def create_rental(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.get("/api/v1/rental", response_model=List[RentalResponse])
-async def get_user_rentals(x_user_name: str = Header(..., alias="X-User-Name")):
-    async def fetch_rentals():
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            rentals_response = await client.get(
-                f"{RENTAL_SERVICE_URL}/api/v1/rental",
-                params={"username": x_user_name}
-            )
-            if rentals_response.status_code != 200:
-                raise HTTPException(status_code=rentals_response.status_code, detail="Rental service error")
-            return rentals_response.json()
+async def coalesced_get(url: str) -> httpx.Response:
+    task = _inflight.get(url)
+    if task is None:
+        task = asyncio.ensure_future(http_client.get(url))
+        _inflight[url] = task
+        task.add_done_callback(lambda _: _inflight.pop(url, None))
+    # Shielded so that one cancelled caller does not cancel the others
+    return await asyncio.shield(task)
 
-    def rentals_fallback():
-        return []
 
-    rental_breaker = circuit_breaker_manager.get_breaker("rental_service")
-    rentals = await rental_breaker.call(fetch_rentals, fallback=rentals_fallback)
-
-    result = []
-
-    for rental in rentals:
-        # Flag to track if car service failed
-        car_fallback_used = {"value": False}
-
-        # Get car info with fallback
-        async def fetch_car():
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                car_response = await client.get(
-                    f"{CARS_SERVICE_URL}/api/v1/cars/{rental['carUid']}"
-                )
-                if car_response.status_code == 200:
-                    car_data = car_response.json()
-                    # Cache car information
-                    car_info_cache[rental["carUid"]] = {
-                        "carUid": car_data.get("carUid"),
-                        "brand": car_data.get("brand", ""),
-                        "model": car_data.get("model", ""),
-                        "registrationNumber": car_data.get("registrationNumber", "")
-                    }
-                    logger.info(f"Cached car info for {rental['carUid']}: {car_data.get('brand')} {car_data.get('model')}")
-                    return car_data
-                raise Exception(f"Failed to fetch car data: {car_response.status_code}")
-
-        def car_fallback():
-            car_fallback_used["value"] = True
-            # Try to get cached car info
-            cached_car = car_info_cache.get(rental["carUid"])
-            if cached_car:
-                return cached_car
-            return {"carUid": rental["carUid"], "brand": "", "model": "", "registrationNumber": ""}
-
-        car_breaker = circuit_breaker_manager.get_breaker("cars_service")
-        car_data = await car_breaker.call(fetch_car, fallback=car_fallback)
-
-        # Get payment info with fallback
-        async def fetch_payment():
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                payment_response = await client.get(
-                    f"{PAYMENT_SERVICE_URL}/api/v1/payment/{rental['paymentUid']}"
-                )
-                if payment_response.status_code == 200:
-                    payment_data = payment_response.json()
-                    # If Cars service failed AND rental is CANCELED AND payment is CANCELED, return empty payment
-                    if car_fallback_used["value"] and rental.get("status") == "CANCELED" and payment_data.get("status") == "CANCELED":
-                        return {}
-                    return payment_data
-                return {}
-
-        def payment_fallback():
-            # If Cars service failed AND rental is CANCELED, return empty payment
-            if car_fallback_used["value"] and rental.get("status") == "CANCELED":
-                return {}
-            return {"paymentUid": rental["paymentUid"], "status": "PAID", "price": 0}
-
-        payment_breaker = circuit_breaker_manager.get_breaker("payment_service")
-        payment_data = await payment_breaker.call(fetch_payment, fallback=payment_fallback)
-
-        # If payment_data is empty dict, return empty payment
-        if not payment_data or (isinstance(payment_data, dict) and not payment_data):
-            result.append(RentalResponse(
-                rental_uid=rental["rentalUid"],
-                status=rental["status"],
-                date_from=rental["dateFrom"],
-                date_to=rental["dateTo"],
-                car=CarInfo(
-                    car_uid=car_data.get("carUid", rental["carUid"]),
-                    brand=car_data.get("brand", ""),
-                    model=car_data.get("model", ""),
-                    registration_number=car_data.get("registrationNumber", "")
-                ),
-                payment={}
-            ))
-        else:
-            result.append(RentalResponse(
-                rental_uid=rental["rentalUid"],
-                status=rental["status"],
-                date_from=rental["dateFrom"],
-                date_to=rental["dateTo"],
-                car=CarInfo(
-                    car_uid=car_data.get("carUid", rental["carUid"]),
-                    brand=car_data.get("brand", ""),
-                    model=car_data.get("model", ""),
-                    registration_number=car_data.get("registrationNumber", "")
-                ),
-                payment=PaymentInfo(
-                    payment_uid=payment_data.get("paymentUid", rental["paymentUid"]),
-                    status=payment_data.get("status", "PAID"),
-                    price=payment_data.get("price", 0)
-                )
-            ))
-
-    return result
+async def set_car_availability(car_uid: str, available: bool) -> httpx.Response:
+    try:
+        return await http_client.patch(
+            f"{CARS_SERVICE_URL}/api/v1/cars/{car_uid}/availability",
+            params={"available": available}
+        )
+    finally:
+        # Dropped even when the request fails, so that reads go back to the
+        # cars service (or its fallback) instead of serving the old state
+        car_details_cache.pop(car_uid, None)
+        cars_page_cache.clear()
 
 
-@app.get("/api/v1/rental/{rental_uid}", response_model=RentalResponse)
-async def get_rental(
-    rental_uid: str,
-    x_user_name: str = Header(..., alias="X-User-Name")
-):
-    async def fetch_rental():
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            rental_response = await client.get(
-                f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}",
-                params={"username": x_user_name}
-            )
-            if rental_response.status_code == 404:
-                raise HTTPException(status_code=404, detail="Rental not found")
-            if rental_response.status_code != 200:
-                raise HTTPException(status_code=rental_response.status_code, detail="Rental service error")
-            return rental_response.json()
+# Compensating operations run by the retry queue
+async def retry_release_car(car_uid: str):
+    await set_car_availability(car_uid, True)
+
+
+async def cancel_payment(payment_uid: str):
+    await http_client.delete(f"{PAYMENT_SERVICE_URL}/api/v1/payment/{payment_uid}")
+    # Keep the last known payment in line with the cancellation
+    cached_payment = await payment_info_cache.get(payment_uid)
+    if cached_payment:
+        await payment_info_cache.set(payment_uid, {**cached_payment, "status": "CANCELED"})
+
+
+retry_queue.register("release_car", retry_release_car)
+retry_queue.register("cancel_payment", cancel_payment)
+
+
+async def release_car(car_uid: str):
+    try:
+        await set_car_availability(car_uid, True)
+    except httpx.RequestError as e:
+        logger.error(f"Failed to release car {car_uid}: {str(e)}")
+
+
+async def cache_car_info(car_uid: str, car_data: dict):
+    await car_info_cache.set(car_uid, {
+        "carUid": car_data.get("carUid"),
+        "brand": car_data.get("brand", ""),
+        "model": car_data.get("model", ""),
+        "registrationNumber": car_data.get("registrationNumber", "")
+    })
+
 
-    rental_breaker = circuit_breaker_manager.get_breaker("rental_service")
-    rental = await rental_breaker.call(fetch_rental)
+async def cached_car_info(car_uid: str) -> dict:
+    cached_car = await car_info_cache.get(car_uid)
+    if cached_car:
+        return cached_car
+    return {"carUid": car_uid, "brand": "", "model": "", "registrationNumber": ""}
 
-    # Flag to track if car service failed
-    car_fallback_used = {"value": False}
 
-    # Get car info with fallback
+async def fetch_car_info(car_uid: str) -> tuple[dict, bool]:
+    car_data = car_details_cache.get(car_uid)
+    if car_data is not None:
+        return car_data, False
+
+    fallback_used = False
+
     async def fetch_car():
-        logger.info(f"Attempting to fetch car data for carUid: {rental['carUid']}")
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            car_response = await client.get(
-                f"{CARS_SERVICE_URL}/api/v1/cars/{rental['carUid']}"
-            )
-            logger.info(f"Car service response status: {car_response.status_code}")
-            if car_response.status_code == 200:
-                car_data = car_response.json()
-                # Cache car information
-                car_info_cache[rental["carUid"]] = {
-                    "carUid": car_data.get("carUid"),
-                    "brand": car_data.get("brand", ""),
-                    "model": car_data.get("model", ""),
-                    "registrationNumber": car_data.get("registrationNumber", "")
-                }
-                logger.info(f"Cached car info for {rental['carUid']}: {car_data.get('brand')} {car_data.get('model')}")
-                return car_data
-            raise Exception(f"Failed to fetch car data: {car_response.status_code}")
-
-    def car_fallback():
-        car_fallback_used["value"] = True
-        logger.info(f"Car fallback called for rental carUid: {rental['carUid']}")
-        logger.info(f"Current cache state: {car_info_cache}")
-        # Try to get cached car info
-        cached_car = car_info_cache.get(rental["carUid"])
-        if cached_car:
-            logger.info(f"Returning cached car data: {cached_car}")
-            return cached_car
-        logger.warning(f"No cached data found, returning empty car data")
-        return {"carUid": rental["carUid"], "brand": "", "model": "", "registrationNumber": ""}
-
-    car_breaker = circuit_breaker_manager.get_breaker("cars_service")
-    logger.info(f"Circuit breaker state before call: {car_breaker.get_state()}")
-    car_data = await car_breaker.call(fetch_car, fallback=car_fallback)
-    logger.info(f"Received car_data: {car_data}")
-
-    # Get payment info with fallback
+        car_response = await coalesced_get(f"{CARS_SERVICE_URL}/api/v1/cars/{car_uid}")
+        if car_response.status_code == 200:
+            car_data = orjson.loads(car_response.content)
+            car_details_cache[car_uid] = car_data
+            await cache_car_info(car_uid, car_data)
+            return car_data
+        raise Exception(f"Failed to fetch car data: {car_response.status_code}")
+
+    async def car_fallback():
+        nonlocal fallback_used
+        fallback_used = True
+        return await cached_car_info(car_uid)
+
+    car_data = await CARS_BREAKER.call(fetch_car, fallback=car_fallback)
+    return car_data, fallback_used
+
+
+# Batch version of fetch_car_info: one cars service call for all uids.
+# Returns carUid -> (car_data, fallback_used)
+async def fetch_cars_info(car_uids: list[str]) -> dict[str, tuple[dict, bool]]:
+    cached = {}
+    for car_uid in car_uids:
+        car_data = car_details_cache.get(car_uid)
+        if car_data is not None:
+            cached[car_uid] = (car_data, False)
+    missing = [car_uid for car_uid in car_uids if car_uid not in cached]
+    if not missing:
+        return cached
+
+    async def fetch_cars():
+        cars_response = await http_client.post(
+            f"{CARS_SERVICE_URL}/api/v1/cars/batch",
+            json={"carUids": missing}
+        )
+        if cars_response.status_code != 200:
+            raise Exception(f"Failed to fetch cars data: {cars_response.status_code}")
+        return {car["carUid"]: car for car in orjson.loads(cars_response.content)}
+
+    async def cars_fallback():
+        return {}
+
+    cars = await CARS_BREAKER.call(fetch_cars, fallback=cars_fallback)
+
+    async def resolve(car_uid: str) -> tuple[dict, bool]:
+        car_data = cars.get(car_uid)
+        if car_data:
+            car_details_cache[car_uid] = car_data
+            await cache_car_info(car_uid, car_data)
+            return car_data, False
+        return await cached_car_info(car_uid), True
+
+    lookups = await asyncio.gather(*(resolve(car_uid) for car_uid in missing))
+    cached.update(zip(missing, lookups))
+    return cached
+
+
+async def cache_payment_info(payment_uid: str, payment_data: dict):
+    await payment_info_cache.set(payment_uid, {
+        "paymentUid": payment_data.get("paymentUid", payment_uid),
+        "status": payment_data.get("status", "PAID"),
+        "price": payment_data.get("price", 0)
+    })
+
+
+async def cached_payment_info(payment_uid: str) -> dict:
+    cached_payment = await payment_info_cache.get(payment_uid)
+    if cached_payment:
+        return cached_payment
+    return {"paymentUid": payment_uid, "status": "PAID", "price": 0}
+
+
+async def fetch_payment_info(payment_uid: str) -> tuple[dict, bool]:
+    fallback_used = False
+
     async def fetch_payment():
-        logger.info(f"Attempting to fetch payment data for paymentUid: {rental['paymentUid']}")
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            payment_response = await client.get(
-                f"{PAYMENT_SERVICE_URL}/api/v1/payment/{rental['paymentUid']}"
-            )
-            logger.info(f"Payment service response status: {payment_response.status_code}")
-            if payment_response.status_code == 200:
-                payment_data = payment_response.json()
-                logger.info(f"Payment data from service: {payment_data}")
-                # If Cars service failed AND rental is CANCELED AND payment is CANCELED, return empty payment
-                if car_fallback_used["value"] and rental.get("status") == "CANCELED" and payment_data.get("status") == "CANCELED":
-                    logger.info("Car fallback was used and rental/payment are CANCELED, returning empty payment")
-                    return {}
-                return payment_data
-            return {}
-
-    def payment_fallback():
-        logger.info(f"Payment fallback called for paymentUid: {rental['paymentUid']}")
-        # If Cars service failed AND rental is CANCELED, return empty payment
-        if car_fallback_used["value"] and rental.get("status") == "CANCELED":
-            logger.info("Car fallback was used and rental is CANCELED, returning empty payment from fallback")
-            return {}
-        return {"paymentUid": rental["paymentUid"], "status": "PAID", "price": 0}
-
-    payment_breaker = circuit_breaker_manager.get_breaker("payment_service")
-    logger.info(f"Payment circuit breaker state: {payment_breaker.get_state()}")
-    payment_data = await payment_breaker.call(fetch_payment, fallback=payment_fallback)
-    logger.info(f"Received payment_data: {payment_data}")
-
-    # If payment_data is empty dict, return empty payment
-    if not payment_data or (isinstance(payment_data, dict) and not payment_data):
-        return RentalResponse(
-            rental_uid=rental["rentalUid"],
-            status=rental["status"],
-            date_from=rental["dateFrom"],
-            date_to=rental["dateTo"],
-            car=CarInfo(
-                car_uid=car_data.get("carUid", rental["carUid"]),
-                brand=car_data.get("brand", ""),
-                model=car_data.get("model", ""),
-                registration_number=car_data.get("registrationNumber", "")
-            ),
-            payment={}
+        payment_response = await coalesced_get(f"{PAYMENT_SERVICE_URL}/api/v1/payment/{payment_uid}")
+        if payment_response.status_code == 200:
+            payment_data = orjson.loads(payment_response.content)
+            await cache_payment_info(payment_uid, payment_data)
+            return payment_data
+        return {}
+
+    async def payment_fallback():
+        nonlocal fallback_used
+        fallback_used = True
+        return await cached_payment_info(payment_uid)
+
+    payment_data = await PAYMENT_BREAKER.call(fetch_payment, fallback=payment_fallback)
+    return payment_data, fallback_used
+
+
+# Batch version of fetch_payment_info: one payment service call for all uids.
+# Returns paymentUid -> (payment_data, fallback_used)
+async def fetch_payments_info(payment_uids: list[str]) -> dict[str, tuple[dict, bool]]:
+    if not payment_uids:
+        return {}
+
+    async def fetch_payments():
+        payments_response = await http_client.post(
+            f"{PAYMENT_SERVICE_URL}/api/v1/payment/batch",
+            json={"paymentUids": payment_uids}
         )
+        if payments_response.status_code != 200:
+            raise Exception(f"Failed to fetch payments data: {payments_response.status_code}")
+        # Unknown payments resolve to {}, as in fetch_payment_info
+        payments = {payment["paymentUid"]: payment for payment in orjson.loads(payments_response.content)}
+        await asyncio.gather(*(
+            cache_payment_info(payment_uid, payment_data)
+            for payment_uid, payment_data in payments.items()
+        ))
+        return {payment_uid: (payments.get(payment_uid, {}), False) for payment_uid in payment_uids}
+
+    async def payments_fallback():
+        lookups = await asyncio.gather(*(
+            cached_payment_info(payment_uid) for payment_uid in payment_uids
+        ))
+        return {
+            payment_uid: (payment_data, True)
+            for payment_uid, payment_data in zip(payment_uids, lookups)
+        }
 
-    return RentalResponse(
-        rental_uid=rental["rentalUid"],
-        status=rental["status"],
-        date_from=rental["dateFrom"],
-        date_to=rental["dateTo"],
-        car=CarInfo(
-            car_uid=car_data.get("carUid", rental["carUid"]),
-            brand=car_data.get("brand", ""),
-            model=car_data.get("model", ""),
-            registration_number=car_data.get("registrationNumber", "")
-        ),
-        payment=PaymentInfo(
-            payment_uid=payment_data.get("paymentUid", rental["paymentUid"]),
-            status=payment_data.get("status", "PAID"),
-            price=payment_data.get("price", 0)
+    return await PAYMENT_BREAKER.call(fetch_payments, fallback=payments_fallback)
+
+
+def build_rental_response(
+    rental: dict,
+    car_data: dict,
+    car_fallback_used: bool,
+    payment_data: dict,
+    payment_fallback_used: bool
+) -> dict:
+    # Built as a plain camelCase dict: the upstream data is already trusted,
+    # so the list endpoint sends it without validating a model per rental
+    # If Cars service failed AND rental is CANCELED, return empty payment
+    # (unless Payment service reported it as still PAID)
+    if car_fallback_used and rental.get("status") == "CANCELED":
+        if payment_fallback_used or payment_data.get("status") == "CANCELED":
+            payment_data = {}
+
+    payment = {}
+    if payment_data:
+        payment = {
+            "paymentUid": payment_data.get("paymentUid", rental["paymentUid"]),
+            "status": payment_data.get("status", "PAID"),
+            "price": payment_data.get("price", 0)
+        }
+
+    return {
+        "rentalUid": rental["rentalUid"],
+        "status": rental["status"],
+        "dateFrom": rental["dateFrom"],
+        "dateTo": rental["dateTo"],
+        "car": {
+            "carUid": car_data.get("carUid", rental["carUid"]),
+            "brand": car_data.get("brand", ""),
+            "model": car_data.get("model", ""),
+            "registrationNumber": car_data.get("registrationNumber", "")
+        },
+        "payment": payment
+    }
+
+
+@app.get("/api/v1/rental", response_model=List[RentalResponse])
+async def get_user_rentals(username: str = Depends(get_user)):
+    async def fetch_rentals():
+        rentals_response = await http_client.get(
+            f"{RENTAL_SERVICE_URL}/api/v1/rental",
+            params={"username": username}
         )
+        if rentals_response.status_code != 200:
+            raise HTTPException(status_code=rentals_response.status_code, detail="Rental service error")
+        return orjson.loads(rentals_response.content)
+
+    async def rentals_fallback():
+        return []
+
+    rentals = await RENTAL_BREAKER.call(fetch_rentals, fallback=rentals_fallback)
+
+    # Rentals can repeat the same car, so each car and payment is fetched once,
+    # with one batch call per service running at the same time
+    car_uids = list(dict.fromkeys(rental["carUid"] for rental in rentals))
+    payment_uids = list(dict.fromkeys(rental["paymentUid"] for rental in rentals))
+
+    car_by_uid, payment_by_uid = await asyncio.gather(
+        fetch_cars_info(car_uids),
+        fetch_payments_info(payment_uids)
     )
 
+    return ORJSONResponse([
+        build_rental_response(
+            rental,
+            *car_by_uid[rental["carUid"]],
+            *payment_by_uid[rental["paymentUid"]]
+        )
+        for rental in rentals
+    ])
 
-@app.delete("/api/v1/rental/{rental_uid}", status_code=204)
-async def cancel_rental(
+
+@app.get("/api/v1/rental/{rental_uid}", response_model=RentalResponse)
+async def get_rental(
     rental_uid: str,
-    x_user_name: str = Header(..., alias="X-User-Name")
+    username: str = Depends(get_user)
 ):
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        # Get rental to get car_uid and payment_uid
-        rental_response = await client.get(
+    async def fetch_rental():
+        rental_response = await http_client.get(
             f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}",
-            params={"username": x_user_name}
+            params={"username": username}
         )
         if rental_response.status_code == 404:
             raise HTTPException(status_code=404, detail="Rental not found")
         if rental_response.status_code != 200:
             raise HTTPException(status_code=rental_response.status_code, detail="Rental service error")
+        return orjson.loads(rental_response.content)
+
+    rental = await RENTAL_BREAKER.call(fetch_rental)
+
+    car_lookup, payment_lookup = await asyncio.gather(
+        fetch_car_info(rental["carUid"]),
+        fetch_payment_info(rental["paymentUid"])
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Rental {rental_uid}: car={car_lookup}, payment={payment_lookup}")
+
+    response = RentalResponse.model_validate(build_rental_response(rental, *car_lookup, *payment_lookup))
+    return ORJSONResponse(response.model_dump(by_alias=True))
+
+
+@app.delete("/api/v1/rental/{rental_uid}", status_code=204)
+async def cancel_rental(
+    rental_uid: str,
+    username: str = Depends(get_user)
+):
+    # Get rental to get car_uid and payment_uid
+    rental_response = await http_client.get(
+        f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}",
+        params={"username": username}
+    )
+    if rental_response.status_code == 404:
+        raise HTTPException(status_code=404, detail="Rental not found")
+    if rental_response.status_code != 200:
+        raise HTTPException(status_code=rental_response.status_code, detail="Rental service error")
 
-        rental = rental_response.json()
+    rental = orjson.loads(rental_response.content)
+    car_uid = rental["carUid"]
+    payment_uid = rental["paymentUid"]
 
-        # Try to cancel rental
+    # Try to cancel rental
+    try:
+        cancel_response = await http_client.delete(
+            f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}",
+            params={"username": username}
+        )
+        if cancel_response.status_code == 409:
+            raise HTTPException(status_code=409, detail="Rental is not in progress")
+        if cancel_response.status_code != 204:
+            raise Exception("Failed to cancel rental")
+
+        # Release car
         try:
-            cancel_response = await client.delete(
-                f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}",
-                params={"username": x_user_name}
-            )
-            if cancel_response.status_code != 204:
-                raise Exception("Failed to cancel rental")
-
-            # Release car
-            try:
-                await client.patch(
-                    f"{CARS_SERVICE_URL}/api/v1/cars/{rental['carUid']}/availability",
-                    params={"available": True}
-                )
-            except Exception as e:
-                logger.warning(f"Failed to release car, adding to retry queue: {str(e)}")
-                async def retry_release_car():
-                    async with httpx.AsyncClient(timeout=5.0) as retry_client:
-                        await retry_client.patch(
-                            f"{CARS_SERVICE_URL}/api/v1/cars/{rental['carUid']}/availability",
-                            params={"available": True}
-                        )
-                await retry_queue.add_task(retry_release_car)
-
-            # Cancel payment
-            try:
-                await client.delete(f"{PAYMENT_SERVICE_URL}/api/v1/payment/{rental['paymentUid']}")
-            except Exception as e:
-                logger.warning(f"Failed to cancel payment, adding to retry queue: {str(e)}")
-                async def retry_cancel_payment():
-                    async with httpx.AsyncClient(timeout=5.0) as retry_client:
-                        await retry_client.delete(f"{PAYMENT_SERVICE_URL}/api/v1/payment/{rental['paymentUid']}")
-                await retry_queue.add_task(retry_cancel_payment)
-
-            return None
+            await set_car_availability(car_uid, True)
+        except Exception as e:
+            logger.warning(f"Failed to release car, adding to retry queue: {str(e)}")
+            await retry_queue.add_task("release_car", car_uid=car_uid)
 
+        # Cancel payment
+        try:
+            await cancel_payment(payment_uid)
         except Exception as e:
-            logger.error(f"Failed to cancel rental: {str(e)}")
-            raise HTTPException(status_code=500, detail="Failed to cancel rental")
+            logger.warning(f"Failed to cancel payment, adding to retry queue: {str(e)}")
+            await retry_queue.add_task("cancel_payment", payment_uid=payment_uid)
+
+        return None
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to cancel rental: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to cancel rental")
 
 
 @app.post("/api/v1/rental/{rental_uid}/finish", status_code=204)
 async def finish_rental(
     rental_uid: str,
-    x_user_name: str = Header(..., alias="X-User-Name")
+    username: str = Depends(get_user)
 ):
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        # Get rental to get car_uid
-        rental_response = await client.get(
-            f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}",
-            params={"username": x_user_name}
-        )
-        if rental_response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Rental not found")
-        if rental_response.status_code != 200:
-            raise HTTPException(status_code=rental_response.status_code, detail="Rental service error")
+    # Get rental to get car_uid
+    rental_response = await http_client.get(
+        f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}",
+        params={"username": username}
+    )
+    if rental_response.status_code == 404:
+        raise HTTPException(status_code=404, detail="Rental not found")
+    if rental_response.status_code != 200:
+        raise HTTPException(status_code=rental_response.status_code, detail="Rental service error")
 
-        rental = rental_response.json()
+    rental = orjson.loads(rental_response.content)
+    car_uid = rental["carUid"]
 
-        # Try to finish rental
-        try:
-            finish_response = await client.post(
-                f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}/finish",
-                params={"username": x_user_name}
-            )
-            if finish_response.status_code != 204:
-                raise Exception("Failed to finish rental")
-
-            # Release car
-            try:
-                await client.patch(
-                    f"{CARS_SERVICE_URL}/api/v1/cars/{rental['carUid']}/availability",
-                    params={"available": True}
-                )
-            except Exception as e:
-                logger.warning(f"Failed to release car, adding to retry queue: {str(e)}")
-                async def retry_release_car():
-                    async with httpx.AsyncClient(timeout=5.0) as retry_client:
-                        await retry_client.patch(
-                            f"{CARS_SERVICE_URL}/api/v1/cars/{rental['carUid']}/availability",
-                            params={"available": True}
-                        )
-                await retry_queue.add_task(retry_release_car)
-
-            return None
+    # Try to finish rental
+    try:
+        finish_response = await http_client.post(
+            f"{RENTAL_SERVICE_URL}/api/v1/rental/{rental_uid}/finish",
+            params={"username": username}
+        )
+        if finish_response.status_code == 409:
+            raise HTTPException(status_code=409, detail="Rental is not in progress")
+        if finish_response.status_code != 204:
+            raise Exception("Failed to finish rental")
 
+        # Release car
+        try:
+            await set_car_availability(car_uid, True)
         except Exception as e:
-            logger.error(f"Failed to finish rental: {str(e)}")
-            raise HTTPException(status_code=500, detail="Failed to finish rental")
+            logger.warning(f"Failed to release car, adding to retry queue: {str(e)}")
+            await retry_queue.add_task("release_car", car_uid=car_uid)
+
+        return None
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to finish rental: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to finish rental")
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    # Car read caches are only dropped by the worker that changes availability
+    # and breaker state is per process, so the gateway defaults to one worker
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8080,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        workers=int(os.getenv("WEB_CONCURRENCY", 1))
+    )
@@ -1,105 +1,244 @@
 import asyncio
-from typing import Callable, Any, Dict
-from dataclasses import dataclass, field
+import heapq
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from dataclasses import dataclass, field, asdict
 from datetime import datetime
 import uuid
 import logging
 
-logger = logging.getLogger(__name__)
+import orjson
+import redis.asyncio as redis
 
+logger = logging.getLogger(__name__)
 
+REDIS_URL = os.getenv("REDIS_URL")
+RETRY_STREAM = "retry_stream"
+RETRY_GROUP = "gateway"
+# Failed tasks wait here, scored by next_retry_at, until they are due again
+RETRY_DELAYED = "retry_delayed"
+
+# Moves due delayed tasks to the stream in one atomic step, so a task is
+# neither lost nor promoted twice by concurrent gateway processes
+PROMOTE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, data in ipairs(due) do
+    redis.call('ZREM', KEYS[1], data)
+    redis.call('XADD', KEYS[2], '*', 'task', data)
+end
+return #due
+"""
+
+
+# A compensating operation stored as data (operation name + parameters)
+# rather than a callable, so that any gateway process can run it
 @dataclass
 class RetryTask:
     task_id: str
-    func: Callable
-    args: tuple = field(default_factory=tuple)
-    kwargs: dict = field(default_factory=dict)
+    op: str
+    params: dict = field(default_factory=dict)
     max_retries: int = 5
     retry_count: int = 0
     created_at: datetime = field(default_factory=datetime.now)
+    next_retry_at: float = 0.0  # time.time() value
+
+    def dumps(self) -> bytes:
+        return orjson.dumps(asdict(self))
 
+    @classmethod
+    def loads(cls, data: bytes) -> "RetryTask":
+        task = cls(**orjson.loads(data))
+        task.created_at = datetime.fromisoformat(task.created_at)
+        return task
 
+
+# Tasks go to a Redis stream read through a consumer group, so they survive
+# gateway restarts and are shared between replicas. Tasks left pending by a
+# dead process are claimed after claim_idle seconds. Without REDIS_URL, or
+# when Redis is unreachable, tasks are kept in process memory.
+# A failed task is rescheduled with exponential backoff (retry_interval,
+# doubled per attempt, capped at max_backoff) without holding up the others.
 class RetryQueue:
-    def __init__(self, retry_interval: float = 30.0):
-        self.queue: asyncio.Queue = asyncio.Queue()
+    def __init__(
+        self,
+        retry_interval: float = 30.0,
+        max_backoff: float = 600.0,
+        claim_idle: float = 120.0,
+        poll_interval: float = 1.0,
+        redis_url: Optional[str] = REDIS_URL
+    ):
+        # Heap of (next_retry_at, task_id) for the in-memory queue
+        self.queue: list[tuple[float, str]] = []
         self.tasks: Dict[str, RetryTask] = {}
+        self.wakeup = asyncio.Event()
+        self.handlers: Dict[str, Callable[..., Awaitable]] = {}
         self.retry_interval = retry_interval
+        self.max_backoff = max_backoff
+        self.claim_idle = claim_idle
+        self.poll_interval = poll_interval
         self.is_running = False
-
-    async def add_task(self, func: Callable, *args, **kwargs) -> str:
-        task_id = str(uuid.uuid4())
-        task = RetryTask(
-            task_id=task_id,
-            func=func,
-            args=args,
-            kwargs=kwargs
-        )
-        self.tasks[task_id] = task
-        await self.queue.put(task_id)
-        logger.info(f"Added task {task_id} to retry queue")
-        return task_id
+        self.workers: list[asyncio.Task] = []
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.redis: Optional[redis.Redis] = None
+        if redis_url:
+            self.redis = redis.from_url(redis_url)
+            self.promote_due = self.redis.register_script(PROMOTE_DUE_SCRIPT)
+
+    def register(self, op: str, handler: Callable[..., Awaitable]):
+        self.handlers[op] = handler
+
+    async def add_task(self, op: str, **params) -> str:
+        task = RetryTask(task_id=str(uuid.uuid4()), op=op, params=params)
+        await self.enqueue(task)
+        logger.info(f"Added task {task.task_id} ({op}) to retry queue")
+        return task.task_id
+
+    async def enqueue(self, task: RetryTask, delay: float = 0.0):
+        task.next_retry_at = time.time() + delay
+        if self.redis is not None:
+            try:
+                if delay > 0:
+                    await self.redis.zadd(RETRY_DELAYED, {task.dumps(): task.next_retry_at})
+                else:
+                    await self.redis.xadd(RETRY_STREAM, {"task": task.dumps()})
+                return
+            except redis.RedisError as e:
+                logger.warning(f"Failed to store task {task.task_id} in Redis, keeping it in memory: {str(e)}")
+
+        self.tasks[task.task_id] = task
+        heapq.heappush(self.queue, (task.next_retry_at, task.task_id))
+        self.wakeup.set()
+
+    async def run_task(self, task: RetryTask):
+        handler = self.handlers.get(task.op)
+        if handler is None:
+            logger.error(f"Task {task.task_id} has unknown operation {task.op}")
+            return
+
+        try:
+            await handler(**task.params)
+            logger.info(f"Task {task.task_id} completed successfully")
+        except Exception as e:
+            task.retry_count += 1
+            logger.warning(
+                f"Task {task.task_id} failed (attempt {task.retry_count}/{task.max_retries}): {str(e)}"
+            )
+
+            if task.retry_count < task.max_retries:
+                delay = min(self.retry_interval * 2 ** (task.retry_count - 1), self.max_backoff)
+                await self.enqueue(task, delay)
+            else:
+                logger.error(f"Task {task.task_id} failed after {task.max_retries} attempts")
 
     async def process_queue(self):
-        self.is_running = True
         logger.info("Retry queue processor started")
 
         while self.is_running:
             try:
-                task_id = await asyncio.wait_for(
-                    self.queue.get(),
-                    timeout=self.retry_interval
-                )
-
-                if task_id not in self.tasks:
+                # Sleep until the earliest task is due or a new one arrives
+                self.wakeup.clear()
+                delay = self.queue[0][0] - time.time() if self.queue else self.retry_interval
+                if delay > 0:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
                     continue
 
-                task = self.tasks[task_id]
-
-                try:
-                    if asyncio.iscoroutinefunction(task.func):
-                        await task.func(*task.args, **task.kwargs)
-                    else:
-                        task.func(*task.args, **task.kwargs)
-
-                    logger.info(f"Task {task_id} completed successfully")
-                    del self.tasks[task_id]
-
-                except Exception as e:
-                    task.retry_count += 1
-                    logger.warning(
-                        f"Task {task_id} failed (attempt {task.retry_count}/{task.max_retries}): {str(e)}"
-                    )
+                _, task_id = heapq.heappop(self.queue)
+                task = self.tasks.pop(task_id, None)
+                if task is None:
+                    continue
 
-                    if task.retry_count < task.max_retries:
-                        await asyncio.sleep(self.retry_interval)
-                        await self.queue.put(task_id)
-                    else:
-                        logger.error(f"Task {task_id} failed after {task.max_retries} attempts")
-                        del self.tasks[task_id]
+                await self.run_task(task)
 
             except asyncio.TimeoutError:
                 continue
             except Exception as e:
                 logger.error(f"Error processing retry queue: {str(e)}")
 
+    async def process_stream(self):
+        logger.info(f"Retry stream consumer {self.consumer} started")
+
+        while self.is_running:
+            try:
+                messages = await self.read_stream()
+                for message_id, fields in messages:
+                    # Entries deleted while pending come back without fields
+                    if fields:
+                        await self.run_task(RetryTask.loads(fields[b"task"]))
+                    await self.redis.xack(RETRY_STREAM, RETRY_GROUP, message_id)
+                    await self.redis.xdel(RETRY_STREAM, message_id)
+
+            except redis.ResponseError as e:
+                if "NOGROUP" not in str(e):
+                    logger.error(f"Error processing retry stream: {str(e)}")
+                    await asyncio.sleep(self.retry_interval)
+                await self.create_group()
+            except Exception as e:
+                logger.error(f"Error processing retry stream: {str(e)}")
+                await asyncio.sleep(self.retry_interval)
+
+    async def read_stream(self) -> list:
+        await self.promote_due(keys=[RETRY_DELAYED, RETRY_STREAM], args=[time.time()])
+
+        # Tasks pending for too long belong to a process that died
+        claimed = await self.redis.xautoclaim(
+            RETRY_STREAM,
+            RETRY_GROUP,
+            self.consumer,
+            min_idle_time=int(self.claim_idle * 1000),
+            count=1
+        )
+        if claimed[1]:
+            return claimed[1]
+
+        response = await self.redis.xreadgroup(
+            RETRY_GROUP,
+            self.consumer,
+            {RETRY_STREAM: ">"},
+            count=1,
+            block=int(self.poll_interval * 1000)
+        )
+        return response[0][1] if response else []
+
+    async def create_group(self):
+        try:
+            await self.redis.xgroup_create(RETRY_STREAM, RETRY_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
     async def start(self):
-        if not self.is_running:
-            asyncio.create_task(self.process_queue())
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self.workers.append(asyncio.create_task(self.process_queue()))
+        if self.redis is not None:
+            self.workers.append(asyncio.create_task(self.process_stream()))
 
     async def stop(self):
         self.is_running = False
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+        if self.redis is not None:
+            await self.redis.aclose()
 
 
     def get_queue_status(self) -> dict:
         return {
-            "queue_size": self.queue.qsize(),
+            "queue_size": len(self.queue),
             "total_tasks": len(self.tasks),
             "tasks": [
                 {
                     "task_id": task.task_id,
+                    "op": task.op,
                     "retry_count": task.retry_count,
                     "max_retries": task.max_retries,
-                    "created_at": task.created_at.isoformat()
+                    "created_at": task.created_at.isoformat(),
+                    "next_retry_at": task.next_retry_at
                 }
                 for task in self.tasks.values()
             ]
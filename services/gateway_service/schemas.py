@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from uuid import UUID
+from datetime import date
 from typing import Literal, Optional
 
 
@@ -13,8 +14,7 @@ class CarResponse(BaseModel):
     type: str
     available: bool
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class PaginationResponse(BaseModel):
@@ -23,8 +23,7 @@ class PaginationResponse(BaseModel):
     total_elements: int = Field(validation_alias="totalElements", serialization_alias="totalElements")
     items: list[CarResponse]
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class CarInfo(BaseModel):
@@ -33,8 +32,7 @@ class CarInfo(BaseModel):
     model: str
     registration_number: str = Field(validation_alias="registrationNumber", serialization_alias="registrationNumber")
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class PaymentInfo(BaseModel):
@@ -42,8 +40,7 @@ class PaymentInfo(BaseModel):
     status: Literal["PAID", "CANCELED"]
     price: int
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class RentalResponse(BaseModel):
@@ -54,17 +51,15 @@ class RentalResponse(BaseModel):
     car: CarInfo
     payment: Optional[PaymentInfo | dict] = None
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class CreateRentalRequest(BaseModel):
     car_uid: UUID = Field(validation_alias="carUid")
-    date_from: str = Field(validation_alias="dateFrom")
-    date_to: str = Field(validation_alias="dateTo")
+    date_from: date = Field(validation_alias="dateFrom")
+    date_to: date = Field(validation_alias="dateTo")
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class CreateRentalResponse(BaseModel):
@@ -75,8 +70,7 @@ class CreateRentalResponse(BaseModel):
     date_to: str = Field(validation_alias="dateTo", serialization_alias="dateTo")
     payment: PaymentInfo
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,139 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+
+import pytest
+
+from retry_queue import RETRY_DELAYED, RETRY_STREAM, RetryQueue, RetryTask
+
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+async def failing_handler(**params):
+    raise RuntimeError("upstream down")
+
+
+def pop_task(queue: RetryQueue) -> RetryTask:
+    _, task_id = heapq.heappop(queue.queue)
+    return queue.tasks.pop(task_id)
+
+
+@pytest.mark.asyncio
+async def test_failed_task_backs_off_exponentially_up_to_max_backoff():
+    queue = RetryQueue(retry_interval=1.0, max_backoff=3.0, redis_url=None)
+    queue.register("release_car", failing_handler)
+    task = RetryTask(task_id="t1", op="release_car", params={"car_uid": "c1"})
+
+    delays = []
+    for _ in range(4):
+        started = time.time()
+        await queue.run_task(task)
+        task = pop_task(queue)
+        delays.append(task.next_retry_at - started)
+
+    assert task.retry_count == 4
+    assert delays == [
+        pytest.approx(1.0, abs=0.1),
+        pytest.approx(2.0, abs=0.1),
+        pytest.approx(3.0, abs=0.1),
+        pytest.approx(3.0, abs=0.1)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_task_is_dropped_after_max_retries():
+    queue = RetryQueue(redis_url=None)
+    queue.register("release_car", failing_handler)
+    task = RetryTask(task_id="t1", op="release_car", max_retries=2)
+
+    await queue.run_task(task)
+    await queue.run_task(pop_task(queue))
+
+    assert queue.queue == []
+    assert queue.tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_unknown_operation_is_logged_and_dropped(caplog):
+    queue = RetryQueue(redis_url=None)
+    task = RetryTask(task_id="t1", op="missing")
+
+    with caplog.at_level(logging.ERROR, logger="retry_queue"):
+        await queue.run_task(task)
+
+    assert "unknown operation missing" in caplog.text
+    assert task.retry_count == 0
+    assert queue.queue == []
+
+
+@pytest.mark.asyncio
+async def test_tasks_run_from_memory_without_redis():
+    queue = RetryQueue(redis_url=None)
+    done = asyncio.Event()
+    calls = []
+
+    async def handler(**params):
+        calls.append(params)
+        done.set()
+
+    queue.register("cancel_payment", handler)
+    await queue.start()
+    try:
+        await queue.add_task("cancel_payment", payment_uid="p1")
+        await asyncio.wait_for(done.wait(), timeout=1)
+    finally:
+        await queue.stop()
+
+    assert calls == [{"payment_uid": "p1"}]
+    assert queue.tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_tasks_stay_in_memory_when_redis_is_unreachable():
+    queue = RetryQueue(redis_url="redis://localhost:1/0")
+    task = RetryTask(task_id="t1", op="release_car")
+
+    try:
+        await queue.enqueue(task, delay=5.0)
+    finally:
+        await queue.redis.aclose()
+
+    assert list(queue.tasks) == ["t1"]
+    assert queue.queue == [(task.next_retry_at, "t1")]
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not TEST_REDIS_URL, reason="TEST_REDIS_URL is not set")
+async def test_failed_task_is_retried_through_redis():
+    queue = RetryQueue(retry_interval=0.2, poll_interval=0.1, redis_url=TEST_REDIS_URL)
+    await queue.redis.delete(RETRY_STREAM, RETRY_DELAYED)
+    done = asyncio.Event()
+    attempts = []
+
+    async def flaky_handler(**params):
+        attempts.append(time.time())
+        if len(attempts) == 1:
+            raise RuntimeError("upstream down")
+        done.set()
+
+    queue.register("release_car", flaky_handler)
+    await queue.start()
+    try:
+        await queue.add_task("release_car", car_uid="c1")
+        await asyncio.wait_for(done.wait(), timeout=5)
+        # The first retry waits retry_interval in the delayed set
+        assert attempts[1] - attempts[0] >= 0.2
+
+        # Entries are acked and deleted once the handler returns
+        for _ in range(50):
+            if await queue.redis.xlen(RETRY_STREAM) == 0:
+                break
+            await asyncio.sleep(0.05)
+        assert await queue.redis.xlen(RETRY_STREAM) == 0
+        assert await queue.redis.zcard(RETRY_DELAYED) == 0
+    finally:
+        await queue.stop()
+
+    assert queue.tasks == {}
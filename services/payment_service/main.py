@@ -1,16 +1,26 @@
 from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import update, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import uvicorn
+import os
 import uuid
 
-from database import engine, get_db, Base
+from database import get_db
 from models import Payment
-from schemas import PaymentCreate, PaymentResponse
+from schemas import PaymentCreate, PaymentResponse, PaymentsBatchRequest
 
-Base.metadata.create_all(bind=engine)
+app = FastAPI(title="Payment Service", default_response_class=ORJSONResponse)
 
-app = FastAPI(title="Payment Service")
+# Read endpoints run these prebuilt SQL statements directly, with no
+# ORM or Core statement construction per request
+SELECT_PAYMENT = text(
+    "SELECT payment_uid, status, price FROM payment WHERE payment_uid = :payment_uid"
+)
+SELECT_PAYMENTS = text(
+    "SELECT payment_uid, status, price FROM payment WHERE payment_uid = ANY(:payment_uids)"
+)
 
 
 @app.get("/manage/health")
@@ -19,36 +29,55 @@ def health_check():
 
 
 @app.post("/api/v1/payment", response_model=PaymentResponse)
-def create_payment(payment: PaymentCreate, db: Session = Depends(get_db)):
+async def create_payment(payment: PaymentCreate, db: AsyncSession = Depends(get_db)):
     db_payment = Payment(
         payment_uid=uuid.uuid4(),
         status="PAID",
         price=payment.price
     )
     db.add(db_payment)
-    db.commit()
-    db.refresh(db_payment)
+    await db.commit()
     return db_payment
 
 
+@app.post("/api/v1/payment/batch", response_model=List[PaymentResponse])
+async def get_payments_batch(batch: PaymentsBatchRequest, db: AsyncSession = Depends(get_db)):
+    # Unknown uids are left out of the result
+    payments = await db.execute(SELECT_PAYMENTS, {"payment_uids": batch.payment_uids})
+    return payments.all()
+
+
 @app.get("/api/v1/payment/{payment_uid}", response_model=PaymentResponse)
-def get_payment(payment_uid: uuid.UUID, db: Session = Depends(get_db)):
-    payment = db.query(Payment).filter(Payment.payment_uid == payment_uid).first()
+async def get_payment(payment_uid: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(SELECT_PAYMENT, {"payment_uid": payment_uid})
+    payment = result.first()
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     return payment
 
 
 @app.delete("/api/v1/payment/{payment_uid}", status_code=204)
-def cancel_payment(payment_uid: uuid.UUID, db: Session = Depends(get_db)):
-    payment = db.query(Payment).filter(Payment.payment_uid == payment_uid).first()
-    if not payment:
+async def cancel_payment(payment_uid: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        update(Payment)
+        .where(Payment.payment_uid == payment_uid)
+        .values(status="CANCELED")
+        .returning(Payment.id)
+    )
+    if result.first() is None:
         raise HTTPException(status_code=404, detail="Payment not found")
 
-    payment.status = "CANCELED"
-    db.commit()
+    await db.commit()
     return None
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8050)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8050,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count()))
+    )
@@ -8,7 +8,7 @@ class Payment(Base):
     __tablename__ = "payment"
 
     id = Column(Integer, primary_key=True, index=True)
-    payment_uid = Column(UUID(as_uuid=True), default=uuid.uuid4, nullable=False)
+    payment_uid = Column(UUID(as_uuid=True), default=uuid.uuid4, unique=True, nullable=False)
     status = Column(String(20), nullable=False)
     price = Column(Integer, nullable=False)
 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from uuid import UUID
 from typing import Literal
 
@@ -16,6 +16,10 @@ class PaymentResponse(BaseModel):
     status: Literal["PAID", "CANCELED"]
     price: int
 
-    class Config:
-        from_attributes = True
-        populate_by_name = True
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
+
+class PaymentsBatchRequest(BaseModel):
+    payment_uids: list[UUID] = Field(validation_alias="paymentUids")
+
+    model_config = ConfigDict(populate_by_name=True)
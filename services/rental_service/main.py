@@ -1,17 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+import os
+
+# pydantic checks every core schema it builds against the core schema
+# definition. Ours are fixed, so skip that step to speed up worker startup;
+# must be set before any model is defined
+os.environ.setdefault("PYDANTIC_SKIP_VALIDATING_CORE_SCHEMAS", "1")
+
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import select, update, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
 from typing import List
 import uvicorn
 import uuid
-from datetime import datetime
+from datetime import datetime, time, timezone
+from functools import lru_cache
 
-from database import engine, get_db, Base
+from database import get_db
 from models import Rental
-from schemas import RentalCreate, RentalResponse
+from schemas import RentalCreate, RentalResponse, RENTAL_LIST_ADAPTER
+
+app = FastAPI(title="Rental Service", default_response_class=ORJSONResponse)
+
+# Read endpoints run these prebuilt SQL statements directly, with no
+# ORM or Core statement construction per request
+SELECT_RENTALS_BY_USERNAME = text(
+    "SELECT rental_uid, username, payment_uid, car_uid, date_from, date_to, status "
+    "FROM rental WHERE username = :username"
+)
+SELECT_RENTAL = text(
+    "SELECT rental_uid, username, payment_uid, car_uid, date_from, date_to, status "
+    "FROM rental WHERE rental_uid = :rental_uid AND username = :username"
+)
+
+
+# Rental responses are written straight to JSON by pydantic-core, skipping
+# FastAPI's response_model validation and jsonable_encoder
+def rental_json(rental: RentalResponse) -> Response:
+    return Response(
+        RentalResponse.__pydantic_serializer__.to_json(rental, by_alias=True),
+        media_type="application/json"
+    )
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Rental Service")
+# Finished and canceled rentals never change again, so their responses are
+# built once per process. Keyed by the whole row, a changed row can't hit
+@lru_cache(maxsize=4096)
+def terminal_rental_response(row) -> RentalResponse:
+    return RentalResponse.from_orm_fast(row)
 
 
 @app.get("/manage/health")
@@ -19,10 +56,20 @@ def health_check():
     return {"status": "ok"}
 
 
+# The body is parsed and validated from raw bytes in one pydantic-core pass,
+# instead of FastAPI's json.loads followed by validation of the dict
 @app.post("/api/v1/rental", response_model=RentalResponse)
-def create_rental(rental: RentalCreate, db: Session = Depends(get_db)):
-    date_from = datetime.fromisoformat(rental.date_from)
-    date_to = datetime.fromisoformat(rental.date_to)
+async def create_rental(request: Request, db: AsyncSession = Depends(get_db)):
+    try:
+        rental = RentalCreate.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+
+    # asyncpg needs aware datetimes for timestamptz columns
+    date_from = datetime.combine(rental.date_from, time.min, tzinfo=timezone.utc)
+    date_to = datetime.combine(rental.date_to, time.min, tzinfo=timezone.utc)
 
     db_rental = Rental(
         rental_uid=uuid.uuid4(),
@@ -34,88 +81,97 @@ def create_rental(rental: RentalCreate, db: Session = Depends(get_db)):
         status="IN_PROGRESS"
     )
     db.add(db_rental)
-    db.commit()
-    db.refresh(db_rental)
-
-    return RentalResponse(
-        rental_uid=db_rental.rental_uid,
-        username=db_rental.username,
-        payment_uid=db_rental.payment_uid,
-        car_uid=db_rental.car_uid,
-        date_from=rental.date_from,
-        date_to=rental.date_to,
-        status=db_rental.status
-    )
+    await db.commit()
+
+    return rental_json(RentalResponse.from_orm_fast(db_rental))
 
 
 @app.get("/api/v1/rental", response_model=List[RentalResponse])
-def get_rentals_by_username(username: str, db: Session = Depends(get_db)):
-    rentals = db.query(Rental).filter(Rental.username == username).all()
-
-    return [
-        RentalResponse(
-            rental_uid=rental.rental_uid,
-            username=rental.username,
-            payment_uid=rental.payment_uid,
-            car_uid=rental.car_uid,
-            date_from=rental.date_from.strftime("%Y-%m-%d"),
-            date_to=rental.date_to.strftime("%Y-%m-%d"),
-            status=rental.status
-        )
-        for rental in rentals
-    ]
+async def get_rentals_by_username(username: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(SELECT_RENTALS_BY_USERNAME, {"username": username})
+
+    return Response(
+        RENTAL_LIST_ADAPTER.dump_json(
+            [RentalResponse.from_orm_fast(rental) for rental in result.all()],
+            by_alias=True
+        ),
+        media_type="application/json"
+    )
 
 
 @app.get("/api/v1/rental/{rental_uid}", response_model=RentalResponse)
-def get_rental(rental_uid: uuid.UUID, username: str, db: Session = Depends(get_db)):
-    rental = db.query(Rental).filter(
-        Rental.rental_uid == rental_uid,
-        Rental.username == username
-    ).first()
+async def get_rental(rental_uid: uuid.UUID, username: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(SELECT_RENTAL, {"rental_uid": rental_uid, "username": username})
+    rental = result.first()
 
     if not rental:
         raise HTTPException(status_code=404, detail="Rental not found")
 
-    return RentalResponse(
-        rental_uid=rental.rental_uid,
-        username=rental.username,
-        payment_uid=rental.payment_uid,
-        car_uid=rental.car_uid,
-        date_from=rental.date_from.strftime("%Y-%m-%d"),
-        date_to=rental.date_to.strftime("%Y-%m-%d"),
-        status=rental.status
+    if rental.status == "IN_PROGRESS":
+        return rental_json(RentalResponse.from_orm_fast(rental))
+    return rental_json(terminal_rental_response(rental))
+
+
+# Moves an IN_PROGRESS rental to its final status in a single UPDATE, so two
+# concurrent cancel/finish calls can't both succeed
+async def close_rental(db: AsyncSession, rental_uid: uuid.UUID, username: str, status: str):
+    result = await db.execute(
+        update(Rental)
+        .where(
+            Rental.rental_uid == rental_uid,
+            Rental.username == username,
+            Rental.status == "IN_PROGRESS"
+        )
+        .values(status=status)
+        .returning(Rental.id)
     )
+    if result.first() is None:
+        exists = await db.scalar(select(Rental.id).where(
+            Rental.rental_uid == rental_uid,
+            Rental.username == username
+        ))
+        if exists is None:
+            raise HTTPException(status_code=404, detail="Rental not found")
+        raise HTTPException(status_code=409, detail="Rental is not in progress")
+
+    await db.commit()
 
 
 @app.delete("/api/v1/rental/{rental_uid}", status_code=204)
-def cancel_rental(rental_uid: uuid.UUID, username: str, db: Session = Depends(get_db)):
-    rental = db.query(Rental).filter(
-        Rental.rental_uid == rental_uid,
-        Rental.username == username
-    ).first()
+async def cancel_rental(rental_uid: uuid.UUID, username: str, db: AsyncSession = Depends(get_db)):
+    await close_rental(db, rental_uid, username, "CANCELED")
+    return None
 
-    if not rental:
-        raise HTTPException(status_code=404, detail="Rental not found")
 
-    rental.status = "CANCELED"
-    db.commit()
+@app.post("/api/v1/rental/{rental_uid}/finish", status_code=204)
+async def finish_rental(rental_uid: uuid.UUID, username: str, db: AsyncSession = Depends(get_db)):
+    await close_rental(db, rental_uid, username, "FINISHED")
     return None
 
 
-@app.post("/api/v1/rental/{rental_uid}/finish", status_code=204)
-def finish_rental(rental_uid: uuid.UUID, username: str, db: Session = Depends(get_db)):
-    rental = db.query(Rental).filter(
-        Rental.rental_uid == rental_uid,
-        Rental.username == username
-    ).first()
+# FastAPI can't see the create body, so its schema is added to the OpenAPI
+# document here, when the document is first built. Doing it in the route
+# decorator would build RentalCreate at import and undo its defer_build
+def openapi():
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        schema["paths"]["/api/v1/rental"]["post"]["requestBody"] = {
+            "content": {"application/json": {"schema": RentalCreate.model_json_schema()}},
+            "required": True
+        }
+    return app.openapi_schema
 
-    if not rental:
-        raise HTTPException(status_code=404, detail="Rental not found")
 
-    rental.status = "FINISHED"
-    db.commit()
-    return None
+app.openapi = openapi
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8060)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8060,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count()))
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, CheckConstraint
+from sqlalchemy import Column, Integer, String, DateTime, CheckConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from database import Base
@@ -21,4 +21,5 @@ class Rental(Base):
             "status IN ('IN_PROGRESS', 'FINISHED', 'CANCELED')",
             name="rental_status_check"
         ),
+        Index("ix_rental_username", "username"),
     )
@@ -1,18 +1,26 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, PlainValidator, TypeAdapter, WithJsonSchema
+from pydantic.alias_generators import to_camel
 from uuid import UUID
-from datetime import datetime
-from typing import Literal
+from datetime import date
+from typing import Annotated, List
+
+# Request bodies carry canonical uid strings, parsed with a single UUID()
+# call instead of pydantic's general UUID validator
+UuidStr = Annotated[
+    UUID,
+    PlainValidator(lambda v: v if isinstance(v, UUID) else UUID(str(v))),
+    WithJsonSchema({"type": "string", "format": "uuid"})
+]
 
 
 class RentalBase(BaseModel):
     username: str
-    payment_uid: UUID = Field(validation_alias="paymentUid")
-    car_uid: UUID = Field(validation_alias="carUid")
-    date_from: str = Field(validation_alias="dateFrom")
-    date_to: str = Field(validation_alias="dateTo")
+    payment_uid: UuidStr
+    car_uid: UuidStr
+    date_from: date
+    date_to: date
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(alias_generator=to_camel, extra="forbid", defer_build=True)
 
 
 class RentalCreate(RentalBase):
@@ -20,14 +28,36 @@ class RentalCreate(RentalBase):
 
 
 class RentalResponse(BaseModel):
-    rental_uid: UUID = Field(serialization_alias="rentalUid")
+    rental_uid: str
     username: str
-    payment_uid: UUID = Field(serialization_alias="paymentUid")
-    car_uid: UUID = Field(serialization_alias="carUid")
-    date_from: str = Field(serialization_alias="dateFrom")
-    date_to: str = Field(serialization_alias="dateTo")
-    status: Literal["IN_PROGRESS", "FINISHED", "CANCELED"]
-
-    class Config:
-        from_attributes = True
-        populate_by_name = True
+    payment_uid: str
+    car_uid: str
+    date_from: date
+    date_to: date
+    # Only ever read back from the database, whose CHECK constraint limits the values
+    status: str
+
+    model_config = ConfigDict(
+        alias_generator=to_camel,
+        from_attributes=True,
+        frozen=True,
+        defer_build=True
+    )
+
+    # Rows come from our own database, so the response is built without
+    # running validation. Untrusted input still goes through RentalCreate
+    @classmethod
+    def from_orm_fast(cls, row):
+        return cls.model_construct(
+            rental_uid=str(row.rental_uid),
+            username=row.username,
+            payment_uid=str(row.payment_uid),
+            car_uid=str(row.car_uid),
+            date_from=row.date_from.date(),
+            date_to=row.date_to.date(),
+            status=row.status
+        )
+
+
+# Built once at import and reused for every list response
+RENTAL_LIST_ADAPTER = TypeAdapter(List[RentalResponse])